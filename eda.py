@@ -1,8 +1,17 @@
+import csv
+import importlib.util
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Polars is optional and only imported when a load actually runs (not on cache hits)
+HAS_POLARS = importlib.util.find_spec("polars") is not None
 
 # ===========================
 # 1. APP CONFIGURATION (PREMIUM UI)
@@ -38,96 +47,366 @@ st.markdown("---")
 # 2. LOAD DATA (MEMORY-EFFICIENT CHUNKED APPROACH)
 # ===========================
 
+PRODUCTS_CSV = "product_hierarchy.csv"
+CITIES_CSV = "store_cities.csv"
+
 @st.cache_data
 def load_support_data():
     """Load product and city lookup tables once (small, cacheable)."""
     try:
-        products = pd.read_csv("product_hierarchy.csv")
-        cities = pd.read_csv("store_cities.csv")
+        # Arrow-backed parsing and string columns (no object dtype)
+        products = pd.read_csv(PRODUCTS_CSV, engine="pyarrow", dtype_backend="pyarrow")
+        cities = pd.read_csv(CITIES_CSV, engine="pyarrow", dtype_backend="pyarrow")
         return products, cities
     except FileNotFoundError as e:
         st.error(f"❌ File not found: {e}. Please ensure 'product_hierarchy.csv' and 'store_cities.csv' are in the folder.")
         st.stop()
 
-def load_sales_chunked(chunksize=100000):
-    """Load sales data in chunks without caching (to avoid MemoryError).
+def _name_lookup(table, key, name_col):
+    """ID -> display name Series (the ID itself when there is no name column).
+    
+    Series.map against this runs as a hash join in C rather than a Python
+    dict lookup per row.
+    """
+    names = table[name_col] if name_col in table.columns else table[key]
+    lookup = pd.Series(names.to_numpy(), index=table[key].to_numpy())
+    return lookup[~lookup.index.duplicated(keep="last")]
+
+SALES_CSV = "sales.csv"
+SALES_PARQUET = "sales.parquet"
+# Bump whenever the conversion output changes, so existing Parquet files are rebuilt
+PARQUET_CONVERTER_VERSION = "3"
+
+# Types fixed at conversion: IDs are dictionary-encoded (categorical in
+# pandas) and dates are parsed once, so no chunk re-parses them. date is
+# read as text and parsed by _parse_dates, so bad values become null.
+SALES_COLUMN_TYPES = {
+    "date": pa.string(),
+    "product_id": pa.dictionary(pa.int32(), pa.string()),
+    "store_id": pa.dictionary(pa.int32(), pa.string()),
+    "revenue": pa.float64(),
+}
+# The only columns the aggregation loop decodes; the display sample is the
+# one full-width read
+SALES_COLUMNS = ["date", "revenue", "product_id", "store_id"]
+# Other known measures, stored as float64. They are read as text and parsed
+# per value by _to_number, so a sparse column that is empty in the first
+# block can't be inferred as null and a stray word can't abort the
+# conversion. Remaining unknown columns (e.g. promo types/bins) stay strings.
+SALES_NUMERIC_COLUMNS = ("sales", "stock", "price", "promo_bin_2", "promo_discount_2", "promo_discount_type_2")
+NUMBER_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+def _sales_column_types():
+    """An explicit Arrow type for every column in the sales.csv header, as read from the CSV."""
+    with open(SALES_CSV, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    return {name: SALES_COLUMN_TYPES.get(name, pa.string()) for name in header}
+
+def _parquet_schema(csv_schema):
+    """The stored schema: CSV types with parsed dates and numeric measures."""
+    schema = csv_schema
+    for index, field in enumerate(csv_schema):
+        if field.name == "date":
+            schema = schema.set(index, pa.field("date", pa.timestamp("s")))
+        elif field.name in SALES_NUMERIC_COLUMNS:
+            schema = schema.set(index, pa.field(field.name, pa.float64()))
+    return schema
+
+# Tried in order per value; the first format that parses wins
+DATE_TIME_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S")
+DATE_ONLY_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M")
+
+def _parse_dates(raw):
+    """Parse a text date column to timestamps; unparsable values become null.
+    
+    Like pd.to_datetime(errors="coerce"), each value is parsed on its own:
+    a bad date nulls only itself and never aborts the conversion.
+    """
+    text = pc.utf8_trim_whitespace(raw)
+    # Timestamps are compared on their first 19 characters, dropping
+    # fractional seconds (the Parquet column has second resolution)
+    head = pc.utf8_slice_codeunits(text, 0, 19)
+    candidates = [pc.strptime(head, format=fmt, unit="s", error_is_null=True) for fmt in DATE_TIME_FORMATS]
+    candidates += [pc.strptime(text, format=fmt, unit="s", error_is_null=True) for fmt in DATE_ONLY_FORMATS]
+    return pc.coalesce(*candidates)
+
+def _to_number(raw):
+    """Parse a text column to float64 per value; non-numbers become null (like pd.to_numeric(errors="coerce"))."""
+    text = pc.utf8_trim_whitespace(raw)
+    is_number = pc.match_substring_regex(text, NUMBER_PATTERN)
+    return pc.cast(pc.if_else(is_number, text, pa.scalar(None, pa.string())), pa.float64())
+
+def _convert_batch(batch, schema):
+    """Parse the text date and numeric columns of one CSV batch into the stored schema."""
+    columns = batch.columns
+    for index, name in enumerate(batch.schema.names):
+        if name == "date":
+            columns[index] = _parse_dates(columns[index])
+        elif name in SALES_NUMERIC_COLUMNS:
+            columns[index] = _to_number(columns[index])
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def _parquet_source_key():
+    """Identifies the current sales.csv and converter; stored in the Parquet metadata."""
+    stat = os.stat(SALES_CSV)
+    return f"{PARQUET_CONVERTER_VERSION}:{stat.st_mtime_ns}:{stat.st_size}".encode()
+
+def _parquet_is_fresh(source_key):
+    """True if sales.parquet was written by this converter from the current sales.csv."""
+    if not os.path.exists(SALES_PARQUET):
+        return False
+    try:
+        metadata = pq.read_schema(SALES_PARQUET).metadata or {}
+    except (pa.ArrowException, OSError):  # Truncated or not a Parquet file
+        return False
+    return metadata.get(b"sales_source") == source_key
+
+def ensure_parquet():
+    """Convert sales.csv to Parquet once; reuse it until the CSV changes.
+    
+    The conversion streams 64 MB blocks through pyarrow, so the CSV is
+    never fully in memory. Freshness is checked against the CSV's mtime
+    and size recorded in the Parquet metadata (not file mtimes, which
+    unzip or cp -p can leave older than an existing Parquet file).
+    Returns the Parquet path.
+    """
+    source_key = _parquet_source_key()
+    if _parquet_is_fresh(source_key):
+        return SALES_PARQUET
+    
+    import pyarrow.csv as pa_csv  # Only needed for the one-off conversion
+    
+    with st.spinner("⏳ Converting sales.csv to Parquet (first run only)..."):
+        reader = pa_csv.open_csv(
+            SALES_CSV,
+            read_options=pa_csv.ReadOptions(block_size=64 << 20),
+            convert_options=pa_csv.ConvertOptions(column_types=_sales_column_types()),
+        )
+        schema = _parquet_schema(reader.schema)
+        schema = schema.with_metadata({**(schema.metadata or {}), b"sales_source": source_key})
+        
+        tmp_path = SALES_PARQUET + ".tmp"
+        try:
+            with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+                for batch in reader:
+                    writer.write_batch(_convert_batch(batch, schema))
+        except BaseException:
+            # Drop the partial file so the next run retries the conversion cleanly
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, SALES_PARQUET)  # Never leave a half-written file behind
+    return SALES_PARQUET
+
+def _sum_by_key(keys, revenue):
+    """Sum revenue per ID in one np.bincount pass over the dictionary indices.
+    
+    Avoids a groupby for every batch; IDs are dictionary-encoded after
+    Parquet conversion, so the indices are already dense integers.
+    """
+    if not pa.types.is_dictionary(keys.type):
+        keys = keys.dictionary_encode()
+    codes = pc.fill_null(keys.indices, -1).to_numpy()
+    valid = codes >= 0  # -1 marks a missing ID
+    sums = np.bincount(codes[valid], weights=revenue.to_numpy()[valid], minlength=len(keys.dictionary))
+    return pd.Series(sums, index=keys.dictionary.to_pylist())
+
+def _reduce_chunk(batch):
+    """Reduce one Arrow record batch to small partial aggregates.
+    
+    Uses pyarrow.compute kernels directly on the batch, so it is never
+    converted to pandas. Runs on a worker thread.
+    """
+    columns = batch.schema.names
+    part = {
+        "revenue": 0,
+        "rows": batch.num_rows,
+        "min_date": None,
+        "max_date": None,
+        "product_revenue": None,
+        "city_revenue": None,
+    }
+    
+    # Date range of this batch (min_max skips nulls)
+    if "date" in columns:
+        date_range = pc.min_max(batch.column("date"))
+        if date_range["min"].is_valid:
+            part["min_date"] = pd.Timestamp(date_range["min"].as_py())
+            part["max_date"] = pd.Timestamp(date_range["max"].as_py())
+    
+    if "revenue" in columns:
+        revenue = pc.fill_null(batch.column("revenue"), 0.0)  # Only the column that feeds the sums
+        part["revenue"] = pc.sum(revenue).as_py() or 0
+        # Keyed by ID; names are resolved once after all batches are merged
+        if "product_id" in columns:
+            part["product_revenue"] = _sum_by_key(batch.column("product_id"), revenue)
+        if "store_id" in columns:
+            part["city_revenue"] = _sum_by_key(batch.column("store_id"), revenue)
+    
+    return part
+
+def _merge_partial(agg_data, part):
+    """Fold one batch's partial aggregates into the running totals."""
+    agg_data["total_revenue"] += part["revenue"]
+    agg_data["total_transactions"] += part["rows"]
+    
+    if part["min_date"] is not None:
+        if agg_data["min_date"] is None:
+            agg_data["min_date"], agg_data["max_date"] = part["min_date"], part["max_date"]
+        else:
+            agg_data["min_date"] = min(agg_data["min_date"], part["min_date"])
+            agg_data["max_date"] = max(agg_data["max_date"], part["max_date"])
+    
+    for key in ("product_revenue", "city_revenue"):
+        if part[key] is not None:
+            agg_data[key].append(part[key])
+
+def _combine(parts):
+    """Reduce the per-chunk ID-keyed sums in a single grouped pass."""
+    if not parts:
+        return None
+    return pd.concat(parts).groupby(level=0, sort=False).sum()
+
+def _resolve_names(series, names_lookup, prefix):
+    """Map an ID-keyed aggregate to display names and return it as a dict."""
+    if series is None:
+        return {}
+    ids = series.index.to_series()
+    series.index = ids.map(names_lookup).fillna(prefix + " " + ids.astype(str)).to_numpy()
+    return series.groupby(level=0).sum().to_dict()
+
+def _attach_names(sample_df, products_lookup, cities_lookup):
+    """Add product/city name columns to the (already capped) display sample."""
+    if "product_id" in sample_df.columns:
+        sample_df["product_name"] = sample_df["product_id"].map(products_lookup)
+    if "store_id" in sample_df.columns:
+        sample_df["city"] = sample_df["store_id"].map(cities_lookup)
+    return sample_df
+
+def _read_sample(parquet_path, sample_size, products_lookup, cities_lookup):
+    """First sample_size rows at full width, with name columns, for display."""
+    first_batch = next(pq.ParquetFile(parquet_path).iter_batches(batch_size=sample_size))
+    sample_df = first_batch.to_pandas()
+    if "revenue" in sample_df.columns:
+        sample_df["revenue"] = sample_df["revenue"].fillna(0.0)  # Same as the sums
+    return _attach_names(sample_df, products_lookup, cities_lookup)
+
+def load_sales_polars(sample_size=50000):
+    """Aggregate sales data with Polars' lazy streaming engine.
+    
+    The scan and all aggregations run as one fused, multi-threaded query,
+    so the full file is never materialized. Returns the same structure as
+    load_sales_chunked(). Errors other than a missing file propagate, so
+    the caller can fall back to the chunked loader.
+    """
+    import polars as pl
+    
+    # `streaming=True` was deprecated in Polars 1.25 and removed in 2.0
+    polars_version = tuple(int(part) for part in pl.__version__.split(".")[:2])
+    collect_kwargs = {"engine": "streaming"} if polars_version >= (1, 25) else {"streaming": True}
+    
+    try:
+        products, cities = load_support_data()
+        products_lookup = _name_lookup(products, "product_id", "product_name")
+        cities_lookup = _name_lookup(cities, "store_id", "city")
+        
+        with st.spinner("⏳ Aggregating sales data..."):
+            lf = pl.scan_parquet(ensure_parquet())
+            dates = pl.col("date")
+            totals_q = lf.select(
+                total_revenue=pl.col("revenue").sum(),
+                total_transactions=pl.len(),
+                min_date=dates.min(),
+                max_date=dates.max(),
+            )
+            # Rows without an ID are skipped, as in the chunked loader
+            product_q = lf.drop_nulls("product_id").group_by("product_id").agg(pl.col("revenue").sum())
+            city_q = lf.drop_nulls("store_id").group_by("store_id").agg(pl.col("revenue").sum())
+            totals, by_product, by_city = pl.collect_all([totals_q, product_q, city_q], **collect_kwargs)
+        
+        if totals["total_transactions"][0] == 0:
+            st.error("❌ No data found in sales.csv")
+            st.stop()
+        
+        # Only the small grouped results cross back into pandas
+        product_revenue = pd.Series(by_product["revenue"].to_list(), index=by_product["product_id"].to_list())
+        city_revenue = pd.Series(by_city["revenue"].to_list(), index=by_city["store_id"].to_list())
+        agg_data = {
+            "total_revenue": totals["total_revenue"][0] or 0,
+            "total_transactions": totals["total_transactions"][0],
+            "min_date": pd.Timestamp(totals["min_date"][0]) if totals["min_date"][0] is not None else None,
+            "max_date": pd.Timestamp(totals["max_date"][0]) if totals["max_date"][0] is not None else None,
+            "product_revenue": _resolve_names(product_revenue, products_lookup, "Product"),
+            "city_revenue": _resolve_names(city_revenue, cities_lookup, "Store"),
+        }
+        
+        # Sample rows for raw data display
+        sample_df = _read_sample(SALES_PARQUET, sample_size, products_lookup, cities_lookup)
+        
+        return agg_data, sample_df, products, cities
+        
+    except FileNotFoundError as e:
+        st.error(f"❌ File not found: {e}. Please ensure 'sales.csv' is in the folder.")
+        st.stop()
+
+def load_sales_chunked(chunksize=100000, sample_size=50000):
+    """Load sales data in chunks so the full file is never in memory.
     
     Returns aggregated stats and a sample of merged rows for display.
     Shows progress bar during loading.
     """
     try:
         products, cities = load_support_data()
-        products_dict = dict(zip(products["product_id"], products.get("product_name", products.columns[1])))
-        cities_dict = dict(zip(cities["store_id"], cities.get("city", cities.columns[1])))
+        products_lookup = _name_lookup(products, "product_id", "product_name")
+        cities_lookup = _name_lookup(cities, "store_id", "city")
         
         # Progress bar and status
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        # Accumulate aggregates and sample rows
+        # Accumulate aggregates
         agg_data = {
             "total_revenue": 0,
             "total_transactions": 0,
             "min_date": None,
             "max_date": None,
-            "product_revenue": {},
-            "city_revenue": {},
-            "dates": []
+            "product_revenue": [],
+            "city_revenue": [],
         }
-        sample_rows = []
         chunk_count = 0
         
-        for chunk in pd.read_csv("sales.csv", chunksize=chunksize, low_memory=False):
-            chunk_count += 1
-            status_text.text(f"⏳ Processing chunk {chunk_count}... ({len(chunk)} rows)")
-            progress_bar.progress(min(chunk_count * 0.1, 0.9))  # Cap at 90% until done
-            
-            # Clean chunk
-            chunk.drop_duplicates(inplace=True)
-            chunk.fillna(0, inplace=True)
-            
-            if "date" in chunk.columns:
-                chunk["date"] = pd.to_datetime(chunk["date"], errors="coerce")
-                agg_data["dates"].extend(chunk["date"].dropna().tolist())
-            
-            if "revenue" in chunk.columns:
-                agg_data["total_revenue"] += chunk["revenue"].sum()
-            
-            agg_data["total_transactions"] += len(chunk)
-            
-            # Aggregate by product
-            if "product_id" in chunk.columns and "revenue" in chunk.columns:
-                for pid, rev in chunk.groupby("product_id")["revenue"].sum().items():
-                    prod_name = products_dict.get(pid, f"Product {pid}")
-                    agg_data["product_revenue"][prod_name] = agg_data["product_revenue"].get(prod_name, 0) + rev
-            
-            # Aggregate by city
-            if "store_id" in chunk.columns and "revenue" in chunk.columns:
-                for sid, rev in chunk.groupby("store_id")["revenue"].sum().items():
-                    city_name = cities_dict.get(sid, f"Store {sid}")
-                    agg_data["city_revenue"][city_name] = agg_data["city_revenue"].get(city_name, 0) + rev
+        # The main thread decodes batches while worker threads reduce them
+        # (Arrow kernels release the GIL); threads, not processes, because a
+        # spawned process would re-run this script
+        workers = max(1, (os.cpu_count() or 2) - 1)
+        parquet_file = pq.ParquetFile(ensure_parquet())
+        columns = [name for name in SALES_COLUMNS if name in parquet_file.schema_arrow.names]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+                chunk_count += 1
+                status_text.text(f"⏳ Processing chunk {chunk_count}... ({batch.num_rows} rows)")
+                progress_bar.progress(min(chunk_count * 0.1, 0.9))  # Cap at 90% until done
+                
+                pending.append(pool.submit(_reduce_chunk, batch))
+                
+                # Bound the chunks in flight so memory stays at a few chunks
+                if len(pending) >= 2 * workers:
+                    _merge_partial(agg_data, pending.pop(0).result())
             
-            # Keep a sample for raw data display (only first few chunks)
-            if len(sample_rows) < 3:  # Reduced: 3 chunks × 100k = up to 300k rows
-                chunk_merge = chunk.copy()
-                if "product_id" in chunk_merge.columns:
-                    chunk_merge["product_name"] = chunk_merge["product_id"].map(products_dict)
-                if "store_id" in chunk_merge.columns:
-                    chunk_merge["city"] = chunk_merge["store_id"].map(cities_dict)
-                sample_rows.append(chunk_merge)
+            for future in pending:
+                _merge_partial(agg_data, future.result())
         
-        if not sample_rows:
+        if agg_data["total_transactions"] == 0:
             st.error("❌ No data found in sales.csv")
             st.stop()
         
-        sample_df = pd.concat(sample_rows, ignore_index=True).iloc[:50000]  # Cap sample at 50k rows
-        del sample_rows  # Free memory
+        # Sample rows for raw data display (the only full-width read)
+        sample_df = _read_sample(SALES_PARQUET, sample_size, products_lookup, cities_lookup)
         
-        # Compute date range
-        if agg_data["dates"]:
-            agg_data["min_date"] = min(agg_data["dates"])
-            agg_data["max_date"] = max(agg_data["dates"])
-            agg_data["dates"] = []  # Clear to save memory
+        # Resolve IDs to display names once, collapsing IDs that share a name
+        agg_data["product_revenue"] = _resolve_names(_combine(agg_data["product_revenue"]), products_lookup, "Product")
+        agg_data["city_revenue"] = _resolve_names(_combine(agg_data["city_revenue"]), cities_lookup, "Store")
         
         progress_bar.progress(1.0)
         status_text.text("✅ Data loaded successfully!")
@@ -141,17 +420,93 @@ def load_sales_chunked(chunksize=100000):
         st.error(f"❌ Error loading data: {e}")
         st.stop()
 
+def _file_version(path):
+    """(mtime, size) of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_data(persist="disk", show_spinner=False)
+def _compute_aggregates(version):
+    """Run the full load once per version of the sales and lookup CSVs.
+    
+    Only the small reduced results are cached (and persisted to disk), so
+    widget reruns and app restarts skip the scan until a file changes.
+    """
+    # A cache miss means an input changed; reread the lookup tables too
+    load_support_data.clear()
+    
+    # Convert once up front, so a bad CSV fails here instead of being
+    # parsed again by the fallback loader
+    try:
+        ensure_parquet()
+    except Exception as e:
+        st.error(f"❌ Error converting sales.csv: {e}")
+        st.stop()
+    
+    # Polars streaming engine when installed, chunked Arrow batches otherwise
+    if HAS_POLARS:
+        try:
+            return load_sales_polars()
+        except Exception as e:
+            st.warning(f"⚠️ Polars engine failed ({e}); falling back to the chunked loader.")
+    return load_sales_chunked()
+
+def load_sales():
+    """Return cached aggregates, keyed on the input files' modification times and sizes.
+    
+    The result is also kept in st.session_state, so reruns within a session
+    (e.g. every date-range change) reuse the same objects instead of
+    unpickling the sample from st.cache_data again.
+    """
+    version = tuple(_file_version(path) for path in (SALES_CSV, PRODUCTS_CSV, CITIES_CSV))
+    if version[0] is None:
+        st.error(f"❌ File not found: {SALES_CSV}. Please ensure 'sales.csv' is in the folder.")
+        st.stop()
+    
+    # Missing lookup files are reported by load_support_data()
+    if st.session_state.get("sales_version") != version:
+        st.session_state["sales_data"] = _compute_aggregates(version)
+        st.session_state["sales_version"] = version
+    return st.session_state["sales_data"]
+
+@st.cache_data(show_spinner=False)
+def top_n(revenue_by_name, n=10):
+    """Largest n entries of a name -> revenue dict (cached across reruns)."""
+    return pd.Series(revenue_by_name).nlargest(n)
+
+@st.cache_data(show_spinner=False)
+def sorted_desc(revenue_by_name):
+    """A name -> revenue dict as a Series sorted high to low (cached across reruns)."""
+    return pd.Series(revenue_by_name).sort_values(ascending=False)
+
+# The frame arguments below are underscore-prefixed so Streamlit doesn't
+# hash up to 50k rows per rerun; data_key (file versions + date range)
+# identifies the filtered sample instead.
+@st.cache_data(show_spinner=False)
+def correlation(_numeric_df, data_key):
+    """Correlation matrix of the numeric sample columns (cached across reruns)."""
+    return _numeric_df.corr()
+
+@st.cache_data(show_spinner=False)
+def describe(_df, data_key):
+    """Summary statistics of the filtered sample (cached across reruns)."""
+    return _df.describe()
+
 # Load the data
-agg_data, sample_data, products_raw, cities_raw = load_sales_chunked()
+agg_data, sample_data, products_raw, cities_raw = load_sales()
 total_revenue = agg_data["total_revenue"]
 total_sales_count = agg_data["total_transactions"]
 avg_ticket = total_revenue / total_sales_count if total_sales_count > 0 else 0
-top_product = max(agg_data["product_revenue"].items(), key=lambda x: x[1])[0] if agg_data["product_revenue"] else "N/A"
+top_product = top_n(agg_data["product_revenue"], 1).index[0] if agg_data["product_revenue"] else "N/A"
 min_date = agg_data.get("min_date")
 max_date = agg_data.get("max_date")
 
 # Mock filtered_data for later use (sidebar filtering will work on sample)
 filtered_data = sample_data
+date_range = None  # (start, end) of the sidebar filter, when one is applied
 if min_date and max_date and "date" in filtered_data.columns:
     filtered_data["date"] = pd.to_datetime(filtered_data["date"], errors="coerce")
 else:
@@ -176,14 +531,21 @@ with st.sidebar:
             max_value=max_date.date() if hasattr(max_date, 'date') else max_date
         )
         
-        # Apply Filter to sample
-        filtered_data = sample_data[
-            (sample_data["date"].dt.date >= start_date) & 
-            (sample_data["date"].dt.date <= end_date)
-        ].copy()
+        # Apply Filter to sample (half-open range compared on the datetime64 column)
+        start_ts = pd.Timestamp(start_date)
+        end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        mask = (sample_data["date"] >= start_ts) & (sample_data["date"] < end_ts)
+        filtered_data = sample_data.loc[mask].copy()
+        date_range = (start_ts, end_ts)
     else:
         st.warning("Date column not found or could not be parsed. Showing all sample rows.")
 
+# Cheap cache key for the filtered sample used by the cached tab helpers
+data_key = (st.session_state["sales_version"], date_range)
+
+# Preview rows go to st.dataframe as an Arrow table, built once after filtering
+preview_table = pa.Table.from_pandas(filtered_data.head(100), preserve_index=False)
+
 # ===========================
 # 4. KEY PERFORMANCE INDICATORS (KPIs)
 # ===========================
@@ -224,13 +586,8 @@ with tab2:
     st.subheader("Top 10 Best Selling Products (Full Dataset)")
     
     if agg_data["product_revenue"]:
-        top_products_series = pd.Series(agg_data["product_revenue"]).nlargest(10)
-        
-        fig, ax = plt.subplots(figsize=(10, 5))
-        sns.barplot(x=top_products_series.values, y=top_products_series.index, palette="viridis", ax=ax)
-        ax.set_xlabel("Revenue")
-        ax.set_ylabel("")
-        st.pyplot(fig)
+        top_products_series = top_n(agg_data["product_revenue"])
+        st.bar_chart(top_products_series, color="#0068C9", horizontal=True, sort=False)
     else:
         st.write("No product data available.")
 
@@ -239,14 +596,8 @@ with tab3:
     st.subheader("City-wise Revenue Distribution (Full Dataset)")
     
     if agg_data["city_revenue"]:
-        city_sales = pd.Series(agg_data["city_revenue"]).sort_values(ascending=False)
-        
-        fig2, ax2 = plt.subplots(figsize=(12, 6))
-        sns.barplot(x=city_sales.index, y=city_sales.values, palette="magma", ax=ax2)
-        plt.xticks(rotation=45)
-        ax2.set_ylabel("Revenue")
-        ax2.set_xlabel("City")
-        st.pyplot(fig2)
+        city_sales = sorted_desc(agg_data["city_revenue"])
+        st.bar_chart(city_sales, color="#0068C9", sort=False)
     else:
         st.write("No city data available.")
 
@@ -260,9 +611,7 @@ with tab4:
         if len(filtered_data) > 0:
             numeric_df = filtered_data.select_dtypes(include=[np.number])
             if not numeric_df.empty and numeric_df.shape[1] > 1:
-                fig3, ax3 = plt.subplots(figsize=(6, 5))
-                sns.heatmap(numeric_df.corr(), annot=True, cmap="coolwarm", ax=ax3, fmt=".2f")
-                st.pyplot(fig3)
+                st.dataframe(correlation(numeric_df, data_key).style.background_gradient(cmap="coolwarm").format("{:.2f}"))
             else:
                 st.write("Not enough numeric columns for correlation.")
         else:
@@ -271,10 +620,10 @@ with tab4:
     with col_d2:
         st.subheader("Sample Data Preview")
         if len(filtered_data) > 0:
-            st.dataframe(filtered_data.head(100), height=400)
+            st.dataframe(preview_table, height=400)
             
             with st.expander("View Basic Statistics"):
-                st.write(filtered_data.describe())
+                st.write(describe(filtered_data, data_key))
         else:
             st.write("No data to display.")
 